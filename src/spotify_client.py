@@ -0,0 +1,126 @@
+import json
+import time
+import asyncio
+from collections import OrderedDict
+import aiohttp
+from spotipy import SpotifyException
+from spotipy.exceptions import SpotifyOauthError
+
+API_BASE = "https://api.spotify.com/v1"
+SEARCH_CACHE_SIZE = 128
+SEARCH_CACHE_TTL = 90  # seconds, Spotify serves search with max-age of 60-120s
+# Same limits spotipy applied by default: 5s timeout, 3 retries with 0.3s backoff
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=5)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SpotifyClient:
+    """Async wrapper around the Spotify Web API endpoints used by the TUI"""
+
+    def __init__(self, auth_manager, session: aiohttp.ClientSession):
+        self.auth_manager = auth_manager
+        self.session = session
+        self._token_info = None
+        # normalized query -> (fetched at, response, ETag)
+        self._search_cache = OrderedDict()
+
+    def _load_token(self):
+        """Refresh (or prompt for) a token through spotipy's auth manager"""
+        try:
+            self.auth_manager.get_access_token(as_dict=False)
+        except SpotifyOauthError as e:
+            raise SpotifyException(401, -1, f"Token refresh failed:\n {e}") from e
+        # The expiry is only available from the cache, so a token that could
+        # not be cached cannot be tracked, report it rather than guessing
+        token_info = self.auth_manager.get_cached_token()
+        if not token_info:
+            raise SpotifyException(401, -1, "Token refresh failed:\n could not cache the access token")
+        return token_info
+
+    async def _auth_headers(self) -> dict:
+        if not self._token_info or self.auth_manager.is_token_expired(self._token_info):
+            # Token refresh is rare and blocking, so it alone goes to a thread
+            self._token_info = await asyncio.to_thread(self._load_token)
+        return {"Authorization": f"Bearer {self._token_info['access_token']}"}
+
+    async def _request(self, method: str, path: str, **kwargs):
+        _, data, _ = await self._send(method, path, **kwargs)
+        return data
+
+    async def _send(self, method: str, path: str, headers=None, **kwargs):
+        """Issue a request, returning (status, decoded body, response headers)"""
+        for attempt in range(MAX_RETRIES + 1):
+            request_headers = {**(headers or {}), **await self._auth_headers()}
+            try:
+                async with self.session.request(
+                    method, f"{API_BASE}{path}", headers=request_headers,
+                    timeout=REQUEST_TIMEOUT, **kwargs
+                ) as response:
+                    status, response_headers = response.status, response.headers
+                    body = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Surface transport failures the same way as API errors
+                raise SpotifyException(None, -1, f"{path}:\n {e!r}") from e
+
+            if status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                await asyncio.sleep(self._retry_delay(response_headers, attempt))
+                continue
+            if status >= 400:
+                try:
+                    msg = json.loads(body)["error"]["message"]
+                except (ValueError, KeyError, TypeError):
+                    msg = body
+                raise SpotifyException(status, -1, f"{path}:\n {msg}")
+            # Player endpoints answer with 204 (or a non-JSON body) and search
+            # revalidation with 304, none of which carry data
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                data = None
+            return status, data, response_headers
+
+    @staticmethod
+    def _retry_delay(headers, attempt: int) -> float:
+        """Honour Retry-After on rate limiting, otherwise back off exponentially"""
+        try:
+            return max(float(headers.get("Retry-After")), 0)
+        except (TypeError, ValueError):
+            return BACKOFF_FACTOR * 2 ** attempt
+
+    async def search(self, q: str, type: str = "track", limit: int = 5):
+        key = f"{type}:{limit}:{q.lower().strip()}"
+        fetched_at, cached, etag = self._search_cache.get(key, (0, None, None))
+        if cached is not None and time.monotonic() - fetched_at < SEARCH_CACHE_TTL:
+            self._search_cache.move_to_end(key)
+            return cached
+
+        headers = {"If-None-Match": etag} if cached is not None and etag else None
+        status, data, response_headers = await self._send(
+            "GET", "/search", headers=headers,
+            params={"q": q, "type": type, "limit": limit}
+        )
+        if status == 304:
+            data = cached
+        self._search_cache[key] = (time.monotonic(), data, response_headers.get("ETag", etag))
+        self._search_cache.move_to_end(key)
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return data
+
+    async def current_playback(self):
+        return await self._request("GET", "/me/player")
+
+    async def start_playback(self, uris=None):
+        data = {"uris": uris} if uris else None
+        return await self._request("PUT", "/me/player/play", json=data)
+
+    async def pause_playback(self):
+        return await self._request("PUT", "/me/player/pause")
+
+    async def next_track(self):
+        return await self._request("POST", "/me/player/next")
+
+    async def previous_track(self):
+        return await self._request("POST", "/me/player/previous")
@@ -1,7 +1,10 @@
 import os
+import math
 import asyncio
-from functools import partial
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import contextlib
+from typing import ClassVar
+import aiohttp
 from dotenv import load_dotenv
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
@@ -10,20 +13,15 @@ from textual.widgets import Header, Footer, Input, Label, Static
 from textual.containers import Vertical, Horizontal
 from textual.keys import Keys
 from textual.binding import Binding
+from spotify_client import SpotifyClient
 
 # Load credentials from secrets.env file
 load_dotenv("secrets.env")
 client_id = os.getenv("SPOTIFY_CLIENT_ID")
 client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
 
-# Spotify authentication
+# Spotify authentication, set up lazily once the app is running
 scope = "user-library-read user-read-playback-state user-modify-playback-state"
-sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-    client_id=client_id,
-    client_secret=client_secret,
-    redirect_uri="http://127.0.0.1:8888/callback",
-    scope=scope
-))
 
 class SpotifyTUI(App):
     """Spotify TUI Application"""
@@ -33,6 +31,9 @@ class SpotifyTUI(App):
         Binding("escape", "blur_search", "Back", show=False)
     ]
 
+    # Debounce window for search-as-you-type, overridable via SPOTIFY_TUI_DEBOUNCE_MS
+    SEARCH_DEBOUNCE_MS: ClassVar[float] = 300
+
     CSS = """
     Screen {
         background: #0f0f1a;
@@ -107,161 +108,349 @@ class SpotifyTUI(App):
 
     def on_mount(self) -> None:
         self.title = "Spotify TUI"
+        self._search_input = self.query_one("#search-input", Input)
+        self._results_box = self.query_one("#results", Static)
+        self._now_playing = self.query_one("#now-playing", Label)
         self.query = ""
         self.track_uri = None
+        self._last_track_name = None
         self.selected_index = 0
         self.results = []
+        self._result_lines = []
         self.search_task = None
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        # Get initial playback state
+        self._search_waiting = False  # search_task is still sleeping in the debounce
+        self._search_seq = 0
+        self.search_debounce_ms = self._debounce_from_env()
+        self.is_playing = False
+        self._refresh_task = None
+        self._playback_task = None
+        self._command_tasks = set()
+        self._command_lock = asyncio.Lock()  # Commands must reach Spotify in order
+        # Small keep-alive pool so API calls reuse an open TLS connection
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+            limit=4, ttl_dns_cache=300, keepalive_timeout=75
+        ))
+        self.client = None
+        self._auth_error = None
+        self._sp_ready = asyncio.create_task(self._connect())
+        self._initial_playback_task = asyncio.create_task(self.load_playback_state())
+
+    def _debounce_from_env(self) -> float:
+        """Read SPOTIFY_TUI_DEBOUNCE_MS, falling back to the default on bad input"""
+        try:
+            debounce = float(os.getenv("SPOTIFY_TUI_DEBOUNCE_MS", self.SEARCH_DEBOUNCE_MS))
+        except ValueError:
+            return self.SEARCH_DEBOUNCE_MS
+        if not math.isfinite(debounce) or debounce < 0:
+            return self.SEARCH_DEBOUNCE_MS
+        return debounce
+
+    def _init_spotify(self) -> None:
+        """Authenticate with Spotify and create the API client"""
+        auth_manager = SpotifyOAuth(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri="http://127.0.0.1:8888/callback",
+            scope=scope
+        )
+        auth_manager.get_access_token(as_dict=False)
+        self.client = SpotifyClient(auth_manager, self.session)
+
+    async def _connect(self) -> None:
+        """Run _init_spotify off the event loop and report auth failures"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def authenticate():
+            try:
+                self._init_spotify()
+                error = None
+            except Exception as e:
+                error = e
+
+            def resolve():
+                if future.done():
+                    return
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+            with contextlib.suppress(RuntimeError):  # Loop already closed on quit
+                loop.call_soon_threadsafe(resolve)
+
+        # OAuth may refresh a token or wait on a browser login. A daemon thread
+        # (not to_thread) keeps quitting mid-login from waiting for it to finish.
+        threading.Thread(target=authenticate, daemon=True).start()
         try:
-            playback = sp.current_playback()
-            self.is_playing = playback and playback.get('is_playing', False)
+            await future
+        except Exception as e:  # SpotifyOauthError is not a SpotifyException
+            self._auth_error = e
+            self._now_playing.update(f"Auth Error: {e}")
+
+    async def _spotify_ready(self) -> bool:
+        """Wait for authentication; shielded so a cancelled caller can't cancel it"""
+        await asyncio.shield(self._sp_ready)
+        if self.client is None:
+            self._now_playing.update(f"Auth Error: {self._auth_error}")
+            return False
+        return True
+
+    async def load_playback_state(self) -> None:
+        """Get initial playback state"""
+        try:
+            if not await self._spotify_ready():
+                return
+            playback = await self.client.current_playback()
+            self.is_playing = bool(playback and playback.get('is_playing', False))
             if playback and playback.get('item'):
-                self.query_one("#now-playing").update(f"Playing: {playback['item']['name']}")
-        except:
+                self._last_track_name = playback['item']['name']
+                self._now_playing.update(f"Playing: {self._last_track_name}")
+        except spotipy.exceptions.SpotifyException:
             self.is_playing = False
 
-    def search_spotify(self, query: str):
-        """Execute Spotify search in a separate thread"""
+    async def search_spotify(self, query: str):
+        """Execute Spotify search without blocking the event loop"""
         if not query.strip():
             return []
         try:
-            results = sp.search(q=query, type="track", limit=5)
+            if not await self._spotify_ready():
+                return []
+            results = await self.client.search(q=query, type="track", limit=5)
             return results["tracks"]["items"]
         except Exception:
             return []
 
     async def delayed_search(self, query: str):
         """Debounced search with delay"""
-        await asyncio.sleep(0.2)  # Reduced to 200ms for better responsiveness
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            self.executor, 
-            partial(self.search_spotify, query)
-        )
+        await asyncio.sleep(self.search_debounce_ms / 1000)
+        self._search_waiting = False
+        await self.run_search(query)
+
+    async def run_search(self, query: str):
+        """Run search immediately and show the results"""
+        seq = self._search_seq
+        results = await self.search_spotify(query)
+        if seq != self._search_seq:
+            return  # A newer query has been typed since, drop stale results
         self.results = results
-        results_box = self.query_one("#results", Static)
+        self._result_lines = [
+            f"  {item['name']} by {item['artists'][0]['name']}" for item in results
+        ]
         if results:
             self.selected_index = 0  # Reset selection on new results
-            results_box.update("\n".join(
-                f"{'>' if i == self.selected_index else ' '} {item['name']} by {item['artists'][0]['name']}"
-                for i, item in enumerate(results)
-            ))
+            self._results_box.update(self._render_results())
         else:
-            results_box.update("No results" if query else "Type to search...")
+            self._results_box.update("No results" if query else "Type to search...")
+
+    def _render_results(self) -> str:
+        """Join the preformatted result lines, marking the selected one"""
+        return "\n".join(
+            ">" + line[1:] if i == self.selected_index else line
+            for i, line in enumerate(self._result_lines)
+        )
 
     async def on_input_changed(self, event: Input.Changed) -> None:
         self.query = event.value.strip()
-        
+        self._search_seq += 1
+
         # Cancel any pending search
-        if self.search_task and not self.search_task.done():
-            self.search_task.cancel()
-        
+        await self.cancel_search()
+
         # Clear results if query is empty
         if not self.query:
             self.results = []
-            self.query_one("#results", Static).update("Type to search...")
+            self._result_lines = []
+            self._results_box.update("Type to search...")
             return
 
         # Start new real-time search
+        self._search_waiting = True
         self.search_task = asyncio.create_task(self.delayed_search(self.query))
 
+    async def cancel_search(self) -> None:
+        """Cancel the pending search and wait for its request to be torn down"""
+        if self.search_task and not self.search_task.done():
+            self.search_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.search_task
+        self._search_waiting = False
+
+    async def on_input_submitted(self, event: Input.Submitted) -> None:
+        # Enter skips the debounce, but leaves a search that is already in flight alone
+        if not self._search_waiting:
+            return
+        await self.cancel_search()
+        self.search_task = asyncio.create_task(self.run_search(self.query))
+
     async def handle_playback(self, action: str) -> None:
         """Handle playback controls in background"""
-        status = self.query_one("#now-playing", Label)
-
         try:
-            # Get current state first
-            playback = sp.current_playback()
-            current_state = playback and playback.get('is_playing', False)
-            
+            if not await self._spotify_ready():
+                return
             if action == "play_pause":
-                if current_state:
-                    sp.pause_playback()
-                    self.is_playing = False
-                    status.update("Paused")
-                else:
-                    sp.start_playback()
-                    self.is_playing = True
-                    if playback and playback.get('item'):
-                        status.update(f"Playing: {playback['item']['name']}")
+                # Decide from the locally tracked state instead of fetching it first
+                was_playing = self.is_playing
+                self.is_playing = not was_playing
+                command = self.client.pause_playback() if was_playing else self.client.start_playback()
+                try:
+                    # A newer keypress may cancel this handler, but not the command
+                    # itself, or is_playing would no longer match Spotify
+                    await asyncio.shield(self._start_command(command))
+                    if was_playing:
+                        self._now_playing.update("Paused")
+                    elif self._last_track_name:
+                        self._now_playing.update(f"Playing: {self._last_track_name}")
+                except spotipy.exceptions.SpotifyException:
+                    # Local state may have been stale, resync it from Spotify
+                    playback = await self.client.current_playback()
+                    self.is_playing = bool(playback and playback.get('is_playing', False))
+                    raise
             elif action in ["next", "previous"]:
-                getattr(sp, f"{action}_track")()
+                # Rapid presses share one refresh, fired after the last of them
+                if self._refresh_task and not self._refresh_task.done():
+                    self._refresh_task.cancel()
+                refresh_task = asyncio.create_task(self._refresh_now_playing())
+                self._refresh_task = refresh_task
+                # Its own tracked task, so cancelling this handler can't drop a skip
+                cmd_task = self._start_command(getattr(self.client, f"{action}_track")())
+                done, _ = await asyncio.wait(
+                    {cmd_task, refresh_task},
+                    timeout=0.5,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # A slow command (new TLS handshake, token refresh) is still
+                    # running: stop polling, but wait for its real outcome
+                    refresh_task.cancel()
+                try:
+                    await asyncio.shield(cmd_task)
+                except spotipy.exceptions.SpotifyException:
+                    refresh_task.cancel()  # Don't show a track the command never reached
+                    raise
                 self.is_playing = True
-                await asyncio.sleep(0.1)
-                new_playback = sp.current_playback()
-                if new_playback and new_playback.get('item'):
-                    status.update(f"Playing: {new_playback['item']['name']}")
+                if not done or not await refresh_task:
+                    # Polling gave up or ran out before the command landed
+                    name = await self._fetch_track_name()
+                    if name:
+                        self._show_track(name)
 
         except spotipy.exceptions.SpotifyException as e:
             if e.http_status == 404:  # No active device
-                status.update("Error: No active Spotify device found")
+                self._now_playing.update("Error: No active Spotify device found")
             else:
-                status.update(f"Playback Error: {str(e)}")
+                self._now_playing.update(f"Playback Error: {str(e)}")
 
-    async def update_track_name(self, status: Label) -> None:
-        """Update track name in background"""
+    async def _refresh_now_playing(self) -> bool:
+        """Show the current track once Spotify has switched to a new one"""
+        previous = self._last_track_name
         try:
-            await asyncio.sleep(0.1)  # Minimum delay to let Spotify update
-            playback = await asyncio.get_event_loop().run_in_executor(
-                self.executor, sp.current_playback
-            )
-            if playback and playback['item']:
-                status.update(f"Playing: {playback['item']['name']}")
-        except:
+            # Poll with backoff (50/100/200ms) until the track name changes
+            for attempt in range(3):
+                await asyncio.sleep(0.05 * 2 ** attempt)
+                name = await self._fetch_track_name()
+                if name and name != previous:
+                    self._show_track(name)
+                    return True
+        except Exception:
             pass  # Ignore errors in background update
+        return False
+
+    async def _fetch_track_name(self):
+        playback = await self.client.current_playback()
+        if playback and playback.get('item'):
+            return playback['item']['name']
+        return None
+
+    def _show_track(self, name: str) -> None:
+        self._last_track_name = name
+        self._now_playing.update(f"Playing: {name}")
 
     async def action_focus_search(self) -> None:
         """Focus the search input."""
-        self.query_one("#search-input").focus()
+        self._search_input.focus()
 
     async def action_blur_search(self) -> None:
         """Blur the search input."""
-        self.query_one("#search-input").blur()
+        self._search_input.blur()
 
     async def on_key(self, event: Keys) -> None:
-        input_widget = self.query_one("#search-input", Input)
-        results_box = self.query_one("#results", Static)
-        status = self.query_one("#now-playing", Label)
-
         # Handle playback controls only when search is not focused
-        if not input_widget.has_focus:
-            if event.key == "space":
-                asyncio.create_task(self.handle_playback("play_pause"))
-            elif event.key == "n":
-                asyncio.create_task(self.handle_playback("next"))
-            elif event.key == "p":
-                asyncio.create_task(self.handle_playback("previous"))
+        if not self._search_input.has_focus:
+            action = {"space": "play_pause", "n": "next", "p": "previous"}.get(event.key)
+            if action:
+                self._start_playback_task(self.handle_playback(action))
             return
 
         # Search results navigation
-        if input_widget.has_focus and self.results:
-            if event.key == "down":
-                self.selected_index = min(self.selected_index + 1, len(self.results) - 1)
-                results_box.update("\n".join(
-                    f"{'>' if i == self.selected_index else ' '} {item['name']} by {item['artists'][0]['name']}"
-                    for i, item in enumerate(self.results)
-                ))
-            elif event.key == "up":
-                self.selected_index = max(self.selected_index - 1, 0)
-                results_box.update("\n".join(
-                    f"{'>' if i == self.selected_index else ' '} {item['name']} by {item['artists'][0]['name']}"
-                    for i, item in enumerate(self.results)
-                ))
+        if self._search_input.has_focus and self.results:
+            if event.key in ("down", "up"):
+                step = 1 if event.key == "down" else -1
+                new_index = min(max(self.selected_index + step, 0), len(self.results) - 1)
+                if new_index == self.selected_index:
+                    return  # Already at the edge of the list, nothing to redraw
+                self.selected_index = new_index
+                self._results_box.update(self._render_results())
             elif event.key == "enter":
+                if self.search_task and not self.search_task.done():
+                    return  # Results are stale, on_input_submitted refreshes them
                 self.track_uri = self.results[self.selected_index]["uri"]
-                try:
-                    sp.start_playback(uris=[self.track_uri])
-                    track_name = self.results[self.selected_index]['name']
-                    status.update(f"Playing: {track_name}")
-                except spotipy.SpotifyException:
-                    status.update("Playback Error")
+                track_name = self.results[self.selected_index]['name']
+                self._start_playback_task(self.play_track(self.track_uri, track_name))
             return
 
+    def _start_playback_task(self, coro) -> None:
+        """Run a playback handler in the background, keeping at most one in flight"""
+        if self._playback_task and not self._playback_task.done():
+            self._playback_task.cancel()
+        self._playback_task = asyncio.create_task(coro)
+
+    def _start_command(self, coro) -> asyncio.Task:
+        """Run a Spotify command as its own tracked task so it can be shielded"""
+        async def run_in_order():
+            try:
+                # The lock is FIFO, so commands are sent one at a time in keypress order
+                async with self._command_lock:
+                    return await coro
+            finally:
+                coro.close()  # No-op once awaited, avoids a warning if cancelled while queued
+
+        task = asyncio.create_task(run_in_order())
+        self._command_tasks.add(task)
+        task.add_done_callback(self._command_done)
+        return task
+
+    def _command_done(self, task: asyncio.Task) -> None:
+        self._command_tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # Its handler may have been cancelled before reporting it
+
+    async def play_track(self, uri: str, name: str) -> None:
+        """Start playing the chosen search result"""
+        try:
+            if not await self._spotify_ready():
+                return
+            await asyncio.shield(self._start_command(self.client.start_playback(uris=[uri])))
+            self._last_track_name = name
+            self.is_playing = True
+            self._now_playing.update(f"Playing: {self._last_track_name}")
+        except spotipy.SpotifyException:
+            self._now_playing.update("Playback Error")
+
     async def on_unmount(self) -> None:
         """Cleanup resources"""
-        self.executor.shutdown(wait=False)
+        # Stop anything still using the session before closing it
+        tasks = [
+            task for task in (
+                self.search_task, self._playback_task, self._refresh_task,
+                self._initial_playback_task, self._sp_ready, *self._command_tasks
+            )
+            if task and not task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.session.close()
 
 if __name__ == "__main__":
     app = SpotifyTUI()